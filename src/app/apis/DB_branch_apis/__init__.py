@@ -1,54 +1,97 @@
 from fastapi import APIRouter, HTTPException
-import requests
+import logging
+import re
 from app.apis.DB_shared_models import (
     Branch, ListBranchesRequest, ListBranchesResponse,
     CreateBranchRequest, CreateBranchResponse,
     SwitchBranchRequest, SwitchBranchResponse,
-    BranchProtectionRequest, BranchProtectionResponse
+    BranchProtectionRequest, BranchProtectionResponse,
+    cached_get, gh_request, gh_request_async, parsed
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/github/branch/api")
 
+# Characters not allowed in sanitized branch names
+_BRANCH_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9_-]')
+
+# Default branch plus a page of branches with their protection. branchProtectionRule
+# is only visible to admins, refUpdateRule exposes classic protection to everyone
+# else and rules covers repository rulesets
+LIST_BRANCHES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef { name }
+    refs(refPrefix: "refs/heads/", first: 100, after: $cursor) {
+      nodes {
+        name
+        branchProtectionRule { id }
+        refUpdateRule { pattern }
+        rules(first: 1) { totalCount }
+      }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+
+def _is_protected(node: dict) -> bool:
+    """Whether a branch has classic protection or any ruleset applied, like REST's protected flag"""
+    return bool(
+        node.get("branchProtectionRule")
+        or node.get("refUpdateRule")
+        or (node.get("rules") or {}).get("totalCount")
+    )
+
 @router.post("/list-branches", response_model=ListBranchesResponse)
-def branch_list_branches(body: ListBranchesRequest):
+async def branch_list_branches(body: ListBranchesRequest):
     try:
         headers = {
             "Authorization": f"Bearer {body.token}",
             "Accept": "application/vnd.github.v3+json"
         }
         
-        # Get default branch
-        repo_url = f"https://api.github.com/repos/{body.repo_name}"
-        repo_response = requests.get(repo_url, headers=headers)
-        if repo_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to fetch repository info")
-        
-        default_branch = repo_response.json()["default_branch"]
-        
-        # Get branches
-        branches_url = f"https://api.github.com/repos/{body.repo_name}/branches"
-        response = requests.get(branches_url, headers=headers)
-        print(f"Fetching branches from {branches_url}")
-        print(f"Response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to fetch branches")
-        
-        branches_data = response.json()
-        print(f"Found branches: {[b['name'] for b in branches_data]}")
+        # Default branch, branches and protection all come from one query,
+        # with further requests only past 100 branches
+        owner, name = body.repo_name.split('/', 1)
+        logger.debug("Fetching branches for %s", body.repo_name)
         branches = []
-        
-        for branch in branches_data:
-            # Check if branch is protected
-            protection_url = f"https://api.github.com/repos/{body.repo_name}/branches/{branch['name']}/protection"
-            protection_response = requests.get(protection_url, headers=headers)
-            is_protected = protection_response.status_code == 200
+        cursor = None
+        while True:
+            response = await gh_request_async(
+                "POST",
+                "https://api.github.com/graphql",
+                headers=headers,
+                json={
+                    "query": LIST_BRANCHES_QUERY,
+                    "variables": {"owner": owner, "name": name, "cursor": cursor}
+                }
+            )
+            result = parsed(response)
+            repository = (result.get("data") or {}).get("repository")
+            if response.status_code != 200 or not repository:
+                errors = result.get("errors") or [result]
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Failed to fetch repository info: {errors[0].get('message', 'Unknown error')}"
+                )
             
-            branches.append(Branch(
-                name=branch["name"],
-                protected=is_protected,
-                default=branch["name"] == default_branch
-            ))
+            default_branch = (repository.get("defaultBranchRef") or {}).get("name")
+            refs = repository["refs"]
+            branches.extend(
+                Branch(
+                    name=node["name"],
+                    protected=_is_protected(node),
+                    default=node["name"] == default_branch
+                )
+                for node in refs["nodes"]
+            )
+            if not refs["pageInfo"]["hasNextPage"]:
+                break
+            cursor = refs["pageInfo"]["endCursor"]
+        
+        logger.debug("Found branches: %s", [b.name for b in branches])
         
         return ListBranchesResponse(branches=branches)
         
@@ -58,11 +101,8 @@ def branch_list_branches(body: ListBranchesRequest):
 def sanitize_branch_name(name: str) -> str:
     """Sanitize branch name to be git compatible.
     Replaces spaces with hyphens and removes special characters."""
-    # Replace spaces with hyphens
-    name = name.strip().replace(' ', '-')
-    # Remove special characters except hyphens and underscores
-    import re
-    return re.sub(r'[^a-zA-Z0-9-_]', '', name)
+    # Replace spaces with hyphens, then remove special characters except hyphens and underscores
+    return _BRANCH_SANITIZE_RE.sub('', name.strip().replace(' ', '-'))
 
 @router.post("/create-branch", response_model=CreateBranchResponse)
 def branch_create_branch(body: CreateBranchRequest):
@@ -75,7 +115,7 @@ def branch_create_branch(body: CreateBranchRequest):
         
         # Get the SHA of the source branch
         ref_url = f"https://api.github.com/repos/{body.repo_name}/git/refs/heads/{body.from_branch}"
-        response = requests.get(ref_url, headers=headers)
+        response = gh_request("GET", ref_url, headers=headers)
         
         if response.status_code != 200:
             return CreateBranchResponse(
@@ -101,7 +141,7 @@ def branch_create_branch(body: CreateBranchRequest):
         }
         
         print(f"Making request to {create_url}")
-        response = requests.post(create_url, headers=headers, json=data)
+        response = gh_request("POST", create_url, headers=headers, json=data)
         print(f"Response status: {response.status_code}")
         print(f"Response body: {response.text}")
         print(f"Creating branch at {create_url}")
@@ -131,9 +171,9 @@ def branch_get_protection(body: BranchProtectionRequest):
         }
         
         url = f"https://api.github.com/repos/{body.repo_name}/branches/{body.branch_name}/protection"
-        response = requests.get(url, headers=headers)
+        status_code, data = cached_get(url, headers)
         
-        if response.status_code != 200:
+        if status_code != 200:
             return BranchProtectionResponse(
                 protected=False,
                 required_reviews=0,
@@ -142,7 +182,6 @@ def branch_get_protection(body: BranchProtectionRequest):
                 required_status_checks=[]
             )
         
-        data = response.json()
         pr_data = data.get("required_pull_request_reviews", {})
         
         return BranchProtectionResponse(
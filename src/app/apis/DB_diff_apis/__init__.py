@@ -1,10 +1,76 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from diff_match_patch import diff_match_patch
+from collections import OrderedDict
+import hashlib
 import re
+import threading
+from typing import Iterator
 
 router = APIRouter(prefix="/diff/api")
 
+# Escapes HTML special characters in a single str.translate pass
+_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Above this many characters semantic cleanup costs more than the diff itself
+SEMANTIC_CLEANUP_MAX_CHARS = 50_000
+
+# (sha256 of repo content, sha256 of workspace content) -> diff HTML,
+# evicted least recently used first
+_diff_cache: OrderedDict[tuple[bytes, bytes], str] = OrderedDict()
+DIFF_CACHE_MAX_SIZE = 256
+# Total characters of HTML held in the cache
+DIFF_CACHE_MAX_CHARS = 32 * 1024 * 1024
+# Larger diffs are not cached so a single one cannot flush the rest
+DIFF_CACHE_MAX_ENTRY_CHARS = 4 * 1024 * 1024
+_diff_cache_chars = 0
+_diff_cache_lock = threading.Lock()
+
+# Stylesheet returned alongside every diff
+_DIFF_STYLES = """
+    .diff-container {
+        font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, Liberation Mono, Courier New, monospace;
+        font-size: 0.875rem;
+        line-height: 1.25rem;
+        width: 100%;
+    }
+    .diff-line {
+        display: flex;
+        border-bottom: 1px solid hsl(var(--border));
+    }
+    .line-number {
+        padding: 0 0.5rem;
+        text-align: right;
+        min-width: 3rem;
+        user-select: none;
+        color: hsl(var(--muted-foreground));
+        border-right: 1px solid hsl(var(--border));
+    }
+    .line-content {
+        padding: 0 0.5rem;
+        white-space: pre;
+        flex: 1;
+        overflow-x: auto;
+    }
+    .diff-deletion {
+        background-color: rgba(239, 68, 68, 0.2);
+    }
+    .diff-addition {
+        background-color: rgba(34, 197, 94, 0.2);
+    }
+    .diff-equal {
+        color: hsl(var(--foreground));
+    }
+    .diff-deletion-text {
+        color: rgb(239, 68, 68);
+        text-decoration: line-through;
+    }
+    .diff-addition-text {
+        color: rgb(34, 197, 94);
+    }
+    """
+
 @router.get("/test")
 def test_diff_api():
     print("Diff API test endpoint called")
@@ -20,7 +86,12 @@ class DiffResponse(BaseModel):
     diff_html: str
     styles: str
 
-def create_diff_html(text1: str, text2: str) -> tuple[str, str]:
+def iter_diff_lines(text1: str, text2: str) -> Iterator[str]:
+    """Yield the HTML fragment for each line of the diff, in order"""
+    # Identical inputs have nothing to diff
+    if text1 == text2:
+        return
+
     # Normalize line endings to LF
     text1 = text1.replace('\r\n', '\n')
     text2 = text2.replace('\r\n', '\n')
@@ -32,99 +103,74 @@ def create_diff_html(text1: str, text2: str) -> tuple[str, str]:
     # Create diff
     dmp = diff_match_patch()
     diffs = dmp.diff_main(text1, text2)
-    dmp.diff_cleanupSemantic(diffs)
+    if max(len(text1), len(text2)) < SEMANTIC_CLEANUP_MAX_CHARS:
+        dmp.diff_cleanupSemantic(diffs)
+    else:
+        dmp.diff_cleanupEfficiency(diffs)
     
     # Split both texts into lines for proper line numbering
     text1_lines = text1.split('\n')
     text2_lines = text2.split('\n')
     
-    # Generate line numbers and formatted HTML
-    html_lines = []
+    # Generate line numbers and formatted HTML, one fragment per line
+    esc = _ESCAPE_TABLE
     line_number_left = 1
     line_number_right = 1
     
     # Process the diffs
     for op, text in diffs:
         lines = text.split('\n')
+        _last_idx = len(lines) - 1
+        _ends_nl = text.endswith('\n')
         
         for i, line in enumerate(lines):
             if op == 0:  # Equal
-                html_lines.append(f'<div class="diff-line">')
-                html_lines.append(f'<div class="line-number">{line_number_left}</div>')
-                html_lines.append(f'<div class="line-number">{line_number_right}</div>')
-                html_lines.append(f'<div class="line-content"><span class="diff-equal">{escape_html(line)}</span></div>')
-                html_lines.append('</div>')
+                yield (
+                    f'<div class="diff-line">'
+                    f'<div class="line-number">{line_number_left}</div>'
+                    f'<div class="line-number">{line_number_right}</div>'
+                    f'<div class="line-content"><span class="diff-equal">{line.translate(esc)}</span></div>'
+                    f'</div>'
+                )
                 
-                if i < len(lines) - 1 or text.endswith('\n'):
+                if i < _last_idx or _ends_nl:
                     line_number_left += 1
                     line_number_right += 1
                     
             elif op == -1:  # Deletion
-                html_lines.append(f'<div class="diff-line">')
-                html_lines.append(f'<div class="line-number">{line_number_left}</div>')
-                html_lines.append(f'<div class="line-number"></div>')
-                html_lines.append(f'<div class="line-content"><div class="diff-deletion">')
-                html_lines.append(f'<span class="diff-deletion-text">{escape_html(line)}</span>')
-                html_lines.append('</div></div></div>')
+                yield (
+                    f'<div class="diff-line">'
+                    f'<div class="line-number">{line_number_left}</div>'
+                    f'<div class="line-number"></div>'
+                    f'<div class="line-content"><div class="diff-deletion">'
+                    f'<span class="diff-deletion-text">{line.translate(esc)}</span>'
+                    f'</div></div></div>'
+                )
                 
-                if i < len(lines) - 1 or text.endswith('\n'):
+                if i < _last_idx or _ends_nl:
                     line_number_left += 1
                     
             else:  # Addition
-                html_lines.append(f'<div class="diff-line">')
-                html_lines.append(f'<div class="line-number"></div>')
-                html_lines.append(f'<div class="line-number">{line_number_right}</div>')
-                html_lines.append(f'<div class="line-content"><div class="diff-addition">')
-                html_lines.append(f'<span class="diff-addition-text">{escape_html(line)}</span>')
-                html_lines.append('</div></div></div>')
+                yield (
+                    f'<div class="diff-line">'
+                    f'<div class="line-number"></div>'
+                    f'<div class="line-number">{line_number_right}</div>'
+                    f'<div class="line-content"><div class="diff-addition">'
+                    f'<span class="diff-addition-text">{line.translate(esc)}</span>'
+                    f'</div></div></div>'
+                )
                 
-                if i < len(lines) - 1 or text.endswith('\n'):
+                if i < _last_idx or _ends_nl:
                     line_number_right += 1
 
-    styles = """
-    .diff-container {
-        font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, Liberation Mono, Courier New, monospace;
-        font-size: 0.875rem;
-        line-height: 1.25rem;
-        width: 100%;
-    }
-    .diff-line {
-        display: flex;
-        border-bottom: 1px solid hsl(var(--border));
-    }
-    .line-number {
-        padding: 0 0.5rem;
-        text-align: right;
-        min-width: 3rem;
-        user-select: none;
-        color: hsl(var(--muted-foreground));
-        border-right: 1px solid hsl(var(--border));
-    }
-    .line-content {
-        padding: 0 0.5rem;
-        white-space: pre;
-        flex: 1;
-        overflow-x: auto;
-    }
-    .diff-deletion {
-        background-color: rgba(239, 68, 68, 0.2);
-    }
-    .diff-addition {
-        background-color: rgba(34, 197, 94, 0.2);
-    }
-    .diff-equal {
-        color: hsl(var(--foreground));
-    }
-    .diff-deletion-text {
-        color: rgb(239, 68, 68);
-        text-decoration: line-through;
-    }
-    .diff-addition-text {
-        color: rgb(34, 197, 94);
-    }
-    """
-    
-    return '\n'.join(html_lines), styles
+def iter_diff_html(text1: str, text2: str) -> Iterator[str]:
+    """Yield the diff wrapped in its container, ready to stream"""
+    yield '<div class="diff-container">'
+    yield from iter_diff_lines(text1, text2)
+    yield '</div>'
+
+def create_diff_html(text1: str, text2: str) -> tuple[str, str]:
+    return ''.join(iter_diff_lines(text1, text2)), _DIFF_STYLES
 
 def format_line(left_changes, right_changes, line_number_left, line_number_right):
     html_parts = ['<div class="diff-line">']    
@@ -153,7 +199,20 @@ def format_line(left_changes, right_changes, line_number_left, line_number_right
     return ''.join(html_parts)
 
 def escape_html(text: str) -> str:
-    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return text.translate(_ESCAPE_TABLE)
+
+def _cache_diff(key: tuple[bytes, bytes], diff_html: str) -> None:
+    """Store a rendered diff, evicting the oldest until both caps are met"""
+    global _diff_cache_chars
+    with _diff_cache_lock:
+        previous = _diff_cache.pop(key, None)
+        if previous is not None:
+            _diff_cache_chars -= len(previous)
+        _diff_cache[key] = diff_html
+        _diff_cache_chars += len(diff_html)
+        while len(_diff_cache) > DIFF_CACHE_MAX_SIZE or _diff_cache_chars > DIFF_CACHE_MAX_CHARS:
+            _, evicted = _diff_cache.popitem(last=False)
+            _diff_cache_chars -= len(evicted)
 
 @router.post("/diff")
 def diff_get_diff(body: DiffRequest) -> DiffResponse:
@@ -166,8 +225,29 @@ def diff_get_diff(body: DiffRequest) -> DiffResponse:
     # Ensure we have valid strings to compare
     repo_content = body.repo_content if body.repo_content is not None else ""
     workspace_content = body.workspace_content if body.workspace_content is not None else ""
-    diff_html, styles = create_diff_html(repo_content, workspace_content)
-    return DiffResponse(
-        diff_html=f'<div class="diff-container">{diff_html}</div>',
-        styles=styles
-    )
\ No newline at end of file
+    if repo_content == workspace_content:
+        return DiffResponse(diff_html='<div class="diff-container"></div>', styles=_DIFF_STYLES)
+
+    # Key on content hashes so the cache never holds on to the inputs
+    key = (
+        hashlib.sha256(repo_content.encode()).digest(),
+        hashlib.sha256(workspace_content.encode()).digest(),
+    )
+    with _diff_cache_lock:
+        diff_html = _diff_cache.get(key)
+        if diff_html is not None:
+            _diff_cache.move_to_end(key)
+    if diff_html is None:
+        diff_html = ''.join(iter_diff_html(repo_content, workspace_content))
+        if len(diff_html) <= DIFF_CACHE_MAX_ENTRY_CHARS:
+            _cache_diff(key, diff_html)
+    return DiffResponse(diff_html=diff_html, styles=_DIFF_STYLES)
+
+@router.post("/diff-stream")
+def diff_stream_diff(body: DiffRequest) -> StreamingResponse:
+    """Stream the diff HTML line by line, preceded by its stylesheet"""
+    def iter_response() -> Iterator[str]:
+        yield f'<style>{_DIFF_STYLES}</style>'
+        yield from iter_diff_html(body.repo_content or "", body.workspace_content or "")
+    
+    return StreamingResponse(iter_response(), media_type='text/html')
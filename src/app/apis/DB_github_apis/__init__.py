@@ -1,29 +1,86 @@
 from fastapi import APIRouter, HTTPException
 import databutton as db
-import requests
+import httpx
+import asyncio
 import base64
+import hashlib
+import logging
+import os
 from app.apis.DB_shared_models import (
     AuthRequest, AuthResponse,
     RepoRequest, Repository, RepositoriesResponse,
     PushRequest, PushResponse,
     SaveTokenRequest, SaveTokenResponse, TokenResponse,
     RepoFile, RepoFilesRequest, RepoFilesResponse,
-    create_github_headers, validate_repo_access,
-    validate_branch_exists, handle_github_error,
-    process_file_for_github
+    gh_request, gh_request_async, create_github_headers, validate_repo_access,
+    validate_branch_exists, handle_github_error, paginate, parsed,
+    process_file_for_github, read_and_encode, get_tree_blob_shas,
+    workspace_full_path, BLOB_STREAM_THRESHOLD
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/github/api")
 
+# Number of file paths looked up per GraphQL commit history query
+COMMIT_DATES_BATCH_SIZE = 50
+
+# Files read, encoded and uploaded at once by the REST push path
+FILE_UPLOAD_CONCURRENCY = 8
+
+# Pushes with more file content than this go through the REST blob API, which
+# streams large files, instead of being inlined in one GraphQL mutation
+COMMIT_MUTATION_MAX_BYTES = BLOB_STREAM_THRESHOLD
+
+# Creates the tree, commit and ref update for a push in one round-trip
+CREATE_COMMIT_MUTATION = """
+mutation($input: CreateCommitOnBranchInput!) {
+  createCommitOnBranch(input: $input) {
+    commit { oid }
+  }
+}
+"""
+
+def token_fingerprint(token: str) -> str:
+    """Identify a token without storing it again"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+def get_cached_username(token: str) -> str | None:
+    """Return the username cached for this token, if any"""
+    try:
+        cached = db.secrets.get("GITHUB_USERNAME")
+    except Exception:
+        return None
+    if cached:
+        fingerprint, _, username = cached.partition(":")
+        if fingerprint == token_fingerprint(token):
+            return username
+    return None
+
 @router.post("/auth", response_model=AuthResponse)
 def github_authenticate(body: AuthRequest):
     try:
         headers = create_github_headers(body.token)
-        response = requests.get("https://api.github.com/user", headers=headers)
+        username = get_cached_username(body.token)
+        if username:
+            # The token may have been revoked since it was cached, a HEAD still
+            # checks it without transferring the user body
+            response = gh_request("HEAD", "https://api.github.com/user", headers=headers)
+            if response.status_code != 200:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            return AuthResponse(success=True, username=username)
+        
+        response = gh_request("GET", "https://api.github.com/user", headers=headers)
         if response.status_code != 200:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user_data = response.json()
-        return AuthResponse(success=True, username=user_data["login"])
+        username = parsed(response)["login"]
+        
+        # Caching is best effort, a failed write must not fail a valid token
+        try:
+            db.secrets.put("GITHUB_USERNAME", f"{token_fingerprint(body.token)}:{username}")
+        except Exception as e:
+            logger.warning("Failed to cache GitHub username: %s", e)
+        return AuthResponse(success=True, username=username)
     except Exception as e:
         handle_github_error(e, "Authentication failed")
 
@@ -31,15 +88,15 @@ def github_authenticate(body: AuthRequest):
 def github_get_repositories(body: RepoRequest):
     try:
         headers = create_github_headers(body.token)
-        response = requests.get("https://api.github.com/user/repos", headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to fetch repositories")
-        
-        repos_data = response.json()
-        repos = [Repository(
-            name=repo["full_name"],
-            description=repo.get("description")
-        ) for repo in repos_data]
+        # GitHub's schema guarantees these fields, so skip validation
+        repos = [
+            Repository.model_construct(
+                name=repo["full_name"],
+                description=repo.get("description")
+            )
+            for page in paginate("https://api.github.com/user/repos", headers)
+            for repo in page
+        ]
         
         return RepositoriesResponse(repositories=repos)
     except Exception as e:
@@ -53,15 +110,15 @@ def github_get_saved_token():
         return TokenResponse(token=token)
     except Exception as e:
         # Only raise exception for actual errors, not for missing token
-        print(f"Error getting token: {str(e)}")
+        logger.warning("Error getting token: %s", e)
         return TokenResponse(token=None)
 
 @router.post("/save-token", response_model=SaveTokenResponse)
 def github_save_token(body: SaveTokenRequest):
     try:
-        # Verify token works
+        # Verify token works, HEAD returns the same status without the user body
         headers = create_github_headers(body.token)
-        response = requests.get("https://api.github.com/user", headers=headers)
+        response = gh_request("HEAD", "https://api.github.com/user", headers=headers)
         if response.status_code != 200:
             raise HTTPException(status_code=401, detail="Invalid token")
         
@@ -72,128 +129,182 @@ def github_save_token(body: SaveTokenRequest):
         handle_github_error(e, "Failed to save token")
 
 @router.post("/repo-files", response_model=RepoFilesResponse)
-def github_get_repo_files(body: RepoFilesRequest):
-    print(f"Fetching files for repo: {body.repo_name}, branch: {body.branch}")
-    print(f"Using token: {body.token[:4]}...{body.token[-4:]}")
+async def github_get_repo_files(body: RepoFilesRequest):
+    logger.debug("Fetching files for repo: %s, branch: %s", body.repo_name, body.branch)
     try:
         # Validate input
         if not body.repo_name or not body.branch or not body.token:
             raise HTTPException(status_code=400, detail="Repository name, branch and token are required")
             
         # Validate repository access and get repo data
-        validate_repo_access(body.token, body.repo_name)
+        repo_data = await asyncio.to_thread(validate_repo_access, body.token, body.repo_name)
         headers = create_github_headers(body.token)
         
-        # Get repository details
-        repo_url = f"https://api.github.com/repos/{body.repo_name}"
-        repo_response = requests.get(repo_url, headers=headers)
-        repo_data = repo_response.json()
+        async def github_get(url: str, headers: dict = headers, **kwargs) -> httpx.Response:
+            return await gh_request_async("GET", url, headers=headers, **kwargs)
         
         # Check if repository is empty
         if repo_data.get('size', 0) == 0:
-            print(f"Repository {body.repo_name} is empty")
+            logger.debug("Repository %s is empty", body.repo_name)
             return RepoFilesResponse(files=[])
         
         # Get branch SHA
-        branch_sha = validate_branch_exists(body.token, body.repo_name, body.branch)
+        branch_sha = await asyncio.to_thread(validate_branch_exists, body.token, body.repo_name, body.branch)
         if not branch_sha:
-            print(f"Branch {body.branch} not found or empty")
+            logger.debug("Branch %s not found or empty", body.branch)
             return RepoFilesResponse(files=[])
         
-        # Get contents recursively using the Contents API
+        # Contents API walk, only used when the recursive tree listing is truncated
         contents_url = f"https://api.github.com/repos/{body.repo_name}/contents"
-        print(f"Fetching contents from: {contents_url}")
-        print(f"Using branch: {body.branch}")
         
-        def get_directory_contents(path=""):
+        async def get_directory_contents(path=""):
             url = f"{contents_url}/{path}" if path else contents_url
-            print(f"Fetching contents from: {url}")
-            print(f"Making request to: {url} with ref: {body.branch}")
-            response = requests.get(url, headers=headers, params={"ref": body.branch})
-            print(f"Response status: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Error response: {response.text}")
+            response = await github_get(url, params={"ref": body.branch})
             
             if response.status_code != 200:
-                print(f"Failed to get contents for path {path}: {response.status_code}")
+                logger.warning("Failed to get contents for path %s: %s %s", path, response.status_code, response.text)
                 return []
             
-            contents = response.json()
+            contents = parsed(response)
             if not isinstance(contents, list):
-                print(f"Unexpected response format for path {path}")
-                print(f"Response type: {type(contents)}")
-                print(f"Response content: {contents}")
+                logger.warning("Unexpected response format for path %s: %r", path, contents)
                 return []
             
             all_contents = []
+            sub_dirs = []
+            debug = logger.isEnabledFor(logging.DEBUG)
             for item in contents:
                 if item["type"] == "file":
-                    print(f"Found file: {item['path']}")
+                    if debug:
+                        logger.debug("Found file: %s", item['path'])
                     all_contents.append(item)
                 elif item["type"] == "dir":
-                    print(f"Found directory: {item['path']}")
-                    all_contents.extend(get_directory_contents(item["path"]))
+                    if debug:
+                        logger.debug("Found directory: %s", item['path'])
+                    sub_dirs.append(item["path"])
+            
+            # Walk sibling directories concurrently
+            nested = await asyncio.gather(*[get_directory_contents(sub_dir) for sub_dir in sub_dirs])
+            for sub_contents in nested:
+                all_contents.extend(sub_contents)
             return all_contents
         
-        # Get all contents recursively
-        all_files = get_directory_contents()
-        print(f"Total files found: {len(all_files)}")
+        # List the whole tree in a single request
+        tree_url = f"https://api.github.com/repos/{body.repo_name}/git/trees/{branch_sha}"
+        logger.debug("Fetching tree from: %s", tree_url)
+        tree_response = await github_get(tree_url, params={"recursive": 1})
+        if tree_response.status_code != 200:
+            logger.warning("Failed to get tree for %s: %s", branch_sha, tree_response.status_code)
+            return RepoFilesResponse(files=[])
         
-        # Process files
-        repo_files = []
-        for item in all_files:
-            # Get file content from the contents API response
-            print(f"Processing file: {item['path']}")
-            print(f"File data: {item.keys()}")
-            
-            if 'content' not in item:
-                print(f"No content field for {item['path']}, fetching directly")
-                # If content is not included, fetch it directly
-                file_url = item['url']
-                file_response = requests.get(file_url, headers=headers)
-                if file_response.status_code == 200:
-                    file_data = file_response.json()
-                    if 'content' in file_data:
-                        try:
-                            content = base64.b64decode(file_data['content']).decode('utf-8')
-                            print(f"Successfully fetched and decoded content for {item['path']}, length: {len(content)}")
-                        except Exception as e:
-                            print(f"Error decoding content for {item['path']}: {str(e)}")
-                            content = ""
-                    else:
-                        print(f"No content in direct file response for {item['path']}")
-                        content = ""
-                else:
-                    print(f"Failed to fetch file content for {item['path']}: {file_response.status_code}")
-                    content = ""
-            else:
-                try:
-                    content = base64.b64decode(item['content']).decode('utf-8')
-                    print(f"Successfully decoded content for {item['path']}, length: {len(content)}")
-                except Exception as e:
-                    print(f"Error decoding content from item for {item['path']}: {str(e)}")
-                    content = ""
-            
-            # Get commit info for the file
-            commits_url = f"https://api.github.com/repos/{body.repo_name}/commits"
-            commits_response = requests.get(
+        tree_data = parsed(tree_response)
+        if tree_data.get("truncated"):
+            logger.debug("Tree listing truncated, falling back to Contents API walk")
+            all_files = await get_directory_contents()
+        else:
+            all_files = [item for item in tree_data.get("tree", []) if item["type"] == "blob"]
+        logger.debug("Total files found: %d", len(all_files))
+        
+        blobs_url = f"https://api.github.com/repos/{body.repo_name}/git/blobs"
+        raw_headers = {**headers, "Accept": "application/vnd.github.raw"}
+        
+        async def get_file_content(item) -> str:
+            # Raw media type returns the blob bytes directly, no base64 round-trip
+            blob_response = await github_get(f"{blobs_url}/{item['sha']}", headers=raw_headers)
+            if blob_response.status_code != 200:
+                logger.warning("Failed to fetch file content for %s: %s", item['path'], blob_response.status_code)
+                return ""
+            try:
+                return blob_response.content.decode('utf-8')
+            except Exception as e:
+                logger.warning("Error decoding content for %s: %s", item['path'], e)
+                return ""
+        
+        commits_url = f"https://api.github.com/repos/{body.repo_name}/commits"
+        
+        async def get_last_modified(path: str) -> str | None:
+            commits_response = await github_get(
                 commits_url,
-                headers=headers,
-                params={"path": item["path"], "per_page": 1}
+                params={"path": path, "per_page": 1}
             )
-            
-            last_modified = None
             if commits_response.status_code == 200:
-                commits = commits_response.json()
+                commits = parsed(commits_response)
                 if commits:
-                    last_modified = commits[0]["commit"]["committer"]["date"]
+                    return commits[0]["commit"]["committer"]["date"]
+            return None
+        
+        owner, name = body.repo_name.split('/', 1)
+        
+        async def get_last_modified_batch(paths: list[str]) -> dict[str, str]:
+            # One aliased history lookup per path, all in a single GraphQL query
+            variables = {"owner": owner, "name": name, "expression": body.branch}
+            declarations = ["$owner: String!", "$name: String!", "$expression: String!"]
+            fields = []
+            for i, path in enumerate(paths):
+                variables[f"p{i}"] = path
+                declarations.append(f"$p{i}: String!")
+                fields.append(f"f{i}: history(path: $p{i}, first: 1) {{ nodes {{ committedDate }} }}")
+            query = (
+                f"query({', '.join(declarations)}) {{ "
+                f"repository(owner: $owner, name: $name) {{ "
+                f"object(expression: $expression) {{ ... on Commit {{ {' '.join(fields)} }} }} }} }}"
+            )
             
-            repo_files.append(RepoFile(
+            response = await gh_request_async(
+                "POST",
+                "https://api.github.com/graphql",
+                headers=headers,
+                json={"query": query, "variables": variables}
+            )
+            if response.status_code != 200:
+                logger.warning("GraphQL commit lookup failed: %s", response.status_code)
+                return {}
+            
+            commit = ((parsed(response).get("data") or {}).get("repository") or {}).get("object") or {}
+            dates = {}
+            for i, path in enumerate(paths):
+                nodes = (commit.get(f"f{i}") or {}).get("nodes") or []
+                if nodes:
+                    dates[path] = nodes[0]["committedDate"]
+            return dates
+        
+        async def get_last_modified_dates(paths: list[str]) -> dict[str, str | None]:
+            batches = [
+                paths[i:i + COMMIT_DATES_BATCH_SIZE]
+                for i in range(0, len(paths), COMMIT_DATES_BATCH_SIZE)
+            ]
+            dates = {}
+            for batch_dates in await asyncio.gather(*[get_last_modified_batch(batch) for batch in batches]):
+                dates.update(batch_dates)
+            
+            # Fall back to REST for anything the GraphQL response did not cover
+            missing = [path for path in paths if path not in dates]
+            if missing:
+                logger.debug("Falling back to REST commit lookup for %d files", len(missing))
+                for path, date in zip(missing, await asyncio.gather(*[get_last_modified(path) for path in missing])):
+                    dates[path] = date
+            return dates
+        
+        async def get_file_contents() -> list[str | None]:
+            if not body.include_content:
+                return [None] * len(all_files)
+            return await asyncio.gather(*[get_file_content(item) for item in all_files])
+        
+        # Fetch contents and commit info for all files concurrently
+        contents, last_modified_dates = await asyncio.gather(
+            get_file_contents(),
+            get_last_modified_dates([item["path"] for item in all_files])
+        )
+        
+        repo_files = [
+            RepoFile(
                 path=item["path"],
                 content=content,
                 sha=item["sha"],
-                last_modified=last_modified
-            ))
+                last_modified=last_modified_dates.get(item["path"])
+            )
+            for item, content in zip(all_files, contents)
+        ]
         
         return RepoFilesResponse(files=repo_files)
         
@@ -201,32 +312,40 @@ def github_get_repo_files(body: RepoFilesRequest):
         handle_github_error(e, "Failed to fetch repository files")
 
 @router.post("/push", response_model=PushResponse)
-def github_push_to_repo(body: PushRequest):
+async def github_push_to_repo(body: PushRequest):
     try:
-        print(f"Pushing to repo: {body.repo_name}, branch: {body.branch}")
+        logger.debug("Pushing to repo: %s, branch: %s", body.repo_name, body.branch)
         
-        # Validate repository access
-        validate_repo_access(body.token, body.repo_name)
+        # Validate repository access and get repo data
+        repo_data = await asyncio.to_thread(validate_repo_access, body.token, body.repo_name)
         headers = create_github_headers(body.token)
-        
-        # Get repository details
-        repo_url = f"https://api.github.com/repos/{body.repo_name}"
-        repo_response = requests.get(repo_url, headers=headers)
-        if repo_response.status_code != 200:
-            return PushResponse(
-                success=False,
-                message=f"Failed to access repository: {repo_response.json().get('message', 'Unknown error')}"
-            )
-        
-        repo_data = repo_response.json()
         is_empty_repo = repo_data.get('size', 0) == 0
         
+        async def create_tree_entries(known_shas: set[str]) -> tuple[list[dict], str]:
+            # Bound the whole read, encode and upload of each file, not just the POST,
+            # so at most FILE_UPLOAD_CONCURRENCY encoded files are held in memory
+            upload_sem = asyncio.Semaphore(FILE_UPLOAD_CONCURRENCY)
+            
+            async def create_tree_entry(file_path: str) -> tuple[dict, str]:
+                async with upload_sem:
+                    return await process_file_for_github(file_path, body.repo_name, headers, known_shas)
+            
+            # gather keeps results in body.files order
+            results = await asyncio.gather(*[create_tree_entry(file_path) for file_path in body.files])
+            new_tree = []
+            for file_path, (tree_entry, error) in zip(body.files, results):
+                if error:
+                    return [], f"Error processing {file_path}: {error}"
+                new_tree.append(tree_entry)
+            return new_tree, ""
+        
         # For empty repositories, create initial README.md using contents API
         if is_empty_repo:
-            print("Creating initial README.md for empty repository using contents API")
+            logger.debug("Creating initial README.md for empty repository using contents API")
             readme_content = "# Workspace Files\n\nThis repository contains workspace files managed by Databutton.\n"
             contents_url = f"https://api.github.com/repos/{body.repo_name}/contents/README.md"
-            contents_response = requests.put(
+            contents_response = await gh_request_async(
+                "PUT",
                 contents_url,
                 headers=headers,
                 json={
@@ -238,45 +357,66 @@ def github_push_to_repo(body: PushRequest):
             if contents_response.status_code != 201:
                 return PushResponse(
                     success=False,
-                    message=f"Failed to create README: {contents_response.json().get('message', 'Unknown error')}"
+                    message=f"Failed to create README: {parsed(contents_response).get('message', 'Unknown error')}"
                 )
-            print("Successfully created README.md using contents API")
+            logger.debug("Successfully created README.md using contents API")
         
         # Check if branch exists
-        branch_sha = validate_branch_exists(body.token, body.repo_name, body.branch)
+        branch_sha = await asyncio.to_thread(validate_branch_exists, body.token, body.repo_name, body.branch)
+        
+        # Blobs already in the repository, so unchanged files are not uploaded again.
+        # A new branch is compared against the default branch it most likely shares content with
+        base_ref = branch_sha or repo_data.get("default_branch")
+        existing_blobs = await get_tree_blob_shas(body.repo_name, base_ref, headers) if base_ref else {}
+        
+        def file_size(file_path: str) -> int:
+            # Unreadable files are reported when they are encoded
+            try:
+                return os.path.getsize(workspace_full_path(file_path))
+            except OSError:
+                return 0
+        
+        sizes = await asyncio.gather(*[asyncio.to_thread(file_size, file_path) for file_path in body.files])
+        large_push = sum(sizes) > COMMIT_MUTATION_MAX_BYTES
         
-        # Create or update branch with files
-        if is_empty_repo or not branch_sha:
-            print(f"Creating initial branch {body.branch} for repository")
+        # Create or update branch with files. Without an existing head to build on
+        # (new branch or freshly initialised repository), or when the content is
+        # too large to inline in a GraphQL mutation, use the REST git data API
+        if is_empty_repo or not branch_sha or large_push:
+            # The bootstrap README commit is replaced rather than built upon
+            parent_sha = branch_sha if branch_sha and not is_empty_repo else None
+            logger.debug("Pushing %s through the git data API on top of %s", body.branch, parent_sha)
             # Create a tree with the files
-            new_tree = []
-            for file_path in body.files:
-                tree_entry, error = process_file_for_github(file_path, body.repo_name, headers)
-                if error:
-                    return PushResponse(success=False, message=f"Error processing {file_path}: {error}")
-                new_tree.append(tree_entry)
+            new_tree, error = await create_tree_entries(set(existing_blobs.values()))
+            if error:
+                return PushResponse(success=False, message=error)
+            if parent_sha and all(existing_blobs.get(entry["path"]) == entry["sha"] for entry in new_tree):
+                return PushResponse(success=True, message="No changes to push, all files are up to date")
             
             # Create tree
             create_tree_url = f"https://api.github.com/repos/{body.repo_name}/git/trees"
-            tree_response = requests.post(create_tree_url, headers=headers, json={"tree": new_tree})
+            tree_data = {"tree": new_tree}
+            if parent_sha:
+                tree_data["base_tree"] = parent_sha
+            tree_response = await gh_request_async("POST", create_tree_url, headers=headers, json=tree_data)
             if tree_response.status_code != 201:
                 return PushResponse(
                     success=False,
-                    message=f"Failed to create tree: {tree_response.json().get('message', 'Unknown error')}"
+                    message=f"Failed to create tree: {parsed(tree_response).get('message', 'Unknown error')}"
                 )
             
             # Create commit
             create_commit_url = f"https://api.github.com/repos/{body.repo_name}/git/commits"
             commit_data = {
                 "message": body.commit_message,
-                "tree": tree_response.json()["sha"],
-                "parents": []
+                "tree": parsed(tree_response)["sha"],
+                "parents": [parent_sha] if parent_sha else []
             }
-            commit_response = requests.post(create_commit_url, headers=headers, json=commit_data)
+            commit_response = await gh_request_async("POST", create_commit_url, headers=headers, json=commit_data)
             if commit_response.status_code != 201:
                 return PushResponse(
                     success=False,
-                    message=f"Failed to create commit: {commit_response.json().get('message', 'Unknown error')}"
+                    message=f"Failed to create commit: {parsed(commit_response).get('message', 'Unknown error')}"
                 )
             
             # Create or update branch reference
@@ -285,114 +425,84 @@ def github_push_to_repo(body: PushRequest):
                 create_ref_url = f"https://api.github.com/repos/{body.repo_name}/git/refs"
                 ref_data = {
                     "ref": f"refs/heads/{body.branch}",
-                    "sha": commit_response.json()["sha"]
+                    "sha": parsed(commit_response)["sha"]
                 }
-                create_ref_response = requests.post(create_ref_url, headers=headers, json=ref_data)
+                create_ref_response = await gh_request_async("POST", create_ref_url, headers=headers, json=ref_data)
                 if create_ref_response.status_code != 201:
                     return PushResponse(
                         success=False,
-                        message=f"Failed to create branch: {create_ref_response.json().get('message', 'Unknown error')}"
+                        message=f"Failed to create branch: {parsed(create_ref_response).get('message', 'Unknown error')}"
                     )
             else:
                 # Update existing branch
                 update_ref_url = f"https://api.github.com/repos/{body.repo_name}/git/refs/heads/{body.branch}"
+                # Only the bootstrap commit may discard history, other updates
+                # must fast-forward like the GraphQL path's expectedHeadOid
                 ref_data = {
-                    "sha": commit_response.json()["sha"],
-                    "force": True
+                    "sha": parsed(commit_response)["sha"],
+                    "force": parent_sha is None
                 }
-                update_ref_response = requests.patch(update_ref_url, headers=headers, json=ref_data)
+                update_ref_response = await gh_request_async("PATCH", update_ref_url, headers=headers, json=ref_data)
                 if update_ref_response.status_code != 200:
                     return PushResponse(
                         success=False,
-                        message=f"Failed to update branch: {update_ref_response.json().get('message', 'Unknown error')}"
+                        message=f"Failed to update branch: {parsed(update_ref_response).get('message', 'Unknown error')}"
                     )
             
             return PushResponse(success=True, message="Successfully pushed all files")
         
-        # For existing branches, get the current tree
-        base_tree = None
-        if branch_sha:
-            # Branch exists, get its tree
-            tree_url = f"https://api.github.com/repos/{body.repo_name}/git/trees/{branch_sha}"
-            tree_response = requests.get(tree_url, headers=headers)
-            
-            if tree_response.status_code == 200:
-                base_tree = branch_sha
-        
-        print(f"Base tree SHA: {base_tree}")
+        # For existing branches, commit every file in a single GraphQL mutation
+        async def encode_file(file_path: str) -> tuple[tuple[str, str, str] | None, str]:
+            try:
+                return await asyncio.to_thread(read_and_encode, file_path), ""
+            except Exception as e:
+                return None, f"Error processing {file_path}: Error processing file: {str(e)}"
         
-        # Create blobs for each file
-        new_tree = []
-        for file_path in body.files:
-            tree_entry, error = process_file_for_github(file_path, body.repo_name, headers)
+        additions = []
+        for encoded, error in await asyncio.gather(*[encode_file(file_path) for file_path in body.files]):
             if error:
-                return PushResponse(success=False, message=f"Error processing {file_path}: {error}")
-            new_tree.append(tree_entry)
-        
-        # Create new tree
-        create_tree_url = f"https://api.github.com/repos/{body.repo_name}/git/trees"
-        tree_data = {
-            "tree": new_tree
-        }
-        if base_tree:
-            tree_data["base_tree"] = base_tree
-        create_tree_response = requests.post(create_tree_url, headers=headers, json=tree_data)
-        
-        if create_tree_response.status_code != 201:
-            return PushResponse(
-                success=False,
-                message=f"Failed to create tree: {create_tree_response.json().get('message', 'Unknown error')}"
-            )
+                return PushResponse(success=False, message=error)
+            github_path, content_b64, blob_sha = encoded
+            if existing_blobs.get(github_path) != blob_sha:
+                additions.append({"path": github_path, "contents": content_b64})
+        
+        if not additions:
+            return PushResponse(success=True, message="No changes to push, all files are up to date")
         
-        new_tree_sha = create_tree_response.json()["sha"]
+        headline, _, message_body = body.commit_message.partition('\n')
+        commit_message = {"headline": headline}
+        if message_body.strip():
+            commit_message["body"] = message_body.strip()
         
-        # Create commit
-        create_commit_url = f"https://api.github.com/repos/{body.repo_name}/git/commits"
-        commit_data = {
-            "message": body.commit_message,
-            "tree": new_tree_sha,
-            "parents": [base_tree] if base_tree else []
-        }
-        commit_response = requests.post(create_commit_url, headers=headers, json=commit_data)
+        logger.debug("Committing %d files on %s at %s", len(additions), body.branch, branch_sha)
+        commit_response = await gh_request_async(
+            "POST",
+            "https://api.github.com/graphql",
+            headers=headers,
+            json={
+                "query": CREATE_COMMIT_MUTATION,
+                "variables": {
+                    "input": {
+                        "branch": {
+                            "repositoryNameWithOwner": body.repo_name,
+                            "branchName": body.branch
+                        },
+                        "message": commit_message,
+                        "expectedHeadOid": branch_sha,
+                        "fileChanges": {"additions": additions}
+                    }
+                }
+            }
+        )
         
-        if commit_response.status_code != 201:
+        commit_result = parsed(commit_response)
+        if commit_response.status_code != 200 or commit_result.get("errors"):
+            errors = commit_result.get("errors") or [commit_result]
             return PushResponse(
                 success=False,
-                message=f"Failed to create commit: {commit_response.json().get('message', 'Unknown error')}"
+                message=f"Failed to create commit: {errors[0].get('message', 'Unknown error')}"
             )
         
-        new_commit_sha = commit_response.json()["sha"]
-        
-        # Create or update branch reference
-        ref_url = f"https://api.github.com/repos/{body.repo_name}/git/refs/heads/{body.branch}"
-        ref_data = {
-            "sha": new_commit_sha,
-            "force": True  # Force update to handle non-fast-forward cases
-        }
-        
-        if not branch_sha:
-            # Branch doesn't exist, create it
-            print(f"Creating new branch: {body.branch}")
-            create_response = requests.post(f"https://api.github.com/repos/{body.repo_name}/git/refs", 
-                                         headers=headers, 
-                                         json={"ref": f"refs/heads/{body.branch}", "sha": new_commit_sha})
-            
-            if create_response.status_code != 201:
-                return PushResponse(
-                    success=False,
-                    message=f"Failed to create branch: {create_response.json().get('message', 'Unknown error')}"
-                )
-        else:
-            # Branch exists, update it
-            print(f"Updating existing branch: {body.branch}")
-            update_response = requests.patch(ref_url, headers=headers, json=ref_data)
-            
-            if update_response.status_code != 200:
-                return PushResponse(
-                    success=False,
-                    message=f"Failed to update branch: {update_response.json().get('message', 'Unknown error')}"
-                )
-        
         return PushResponse(success=True, message="Successfully pushed all files")
         
     except Exception as e:
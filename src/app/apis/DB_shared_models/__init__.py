@@ -1,76 +1,413 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List
-import requests
+from pydantic import BaseModel, ConfigDict
+from typing import Any, AsyncIterator, Iterator, List
+from collections import OrderedDict, deque
+from functools import lru_cache
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+import httpx
+
+__all__ = [
+    "router",
+    # HTTP clients
+    "CLIENT", "ASYNC_CLIENT", "GH_SEM",
+    # Upload limits
+    "BLOB_STREAM_THRESHOLD",
+    # Shared utility functions
+    "create_github_headers", "parsed", "gh_request", "gh_request_async",
+    "paginate", "cached_get", "validate_repo_access", "validate_branch_exists",
+    "handle_github_error", "workspace_full_path", "git_blob_sha", "file_blob_sha",
+    "read_and_encode", "get_tree_blob_shas", "iter_blob_payload", "process_file_for_github",
+    # Models
+    "AuthRequest", "AuthResponse",
+    "Repository", "RepoRequest", "RepositoriesResponse",
+    "PushRequest", "PushResponse",
+    "SaveTokenRequest", "SaveTokenResponse", "TokenResponse",
+    "RepoFile", "RepoFilesRequest", "RepoFilesResponse",
+    "Branch", "ListBranchesRequest", "ListBranchesResponse",
+    "CreateBranchRequest", "CreateBranchResponse",
+    "SwitchBranchRequest", "SwitchBranchResponse",
+    "BranchProtectionRequest", "BranchProtectionResponse",
+    "FileInfo", "DirectoryContent", "ReadFileRequest", "ReadFileResponse",
+]
+
+logger = logging.getLogger(__name__)
 
 # Dummy router to prevent import warnings
 router = APIRouter()
 
+# HTTP/2 multiplexes concurrent GitHub calls over one connection. It needs the
+# optional h2 package (httpx[http2]), fall back to HTTP/1.1 without it.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Shared clients so GitHub calls reuse pooled connections
+CLIENT = httpx.Client(
+    http2=_HTTP2,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    headers={"Accept": "application/vnd.github.v3+json"},
+    follow_redirects=True,
+    timeout=30
+)
+ASYNC_CLIENT = httpx.AsyncClient(
+    http2=_HTTP2,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    headers={"Accept": "application/vnd.github.v3+json"},
+    follow_redirects=True,
+    timeout=30
+)
+
+# Conditional GET cache: (url, authorization) -> (etag, parsed body, next page url),
+# least recently used first
+ETAG_CACHE: OrderedDict[tuple[str, str], tuple[str, Any, str | None]] = OrderedDict()
+ETAG_CACHE_MAX_SIZE = 256
+_ETAG_CACHE_LOCK = threading.Lock()
+
+# Retry policy for GitHub API calls
+GITHUB_MAX_RETRIES = 4
+# Back off 0.5s, 1s, 2s, 4s on server errors
+GITHUB_RETRY_BACKOFF = 0.5
+# Never hold a request longer than this waiting on a rate limit, fail fast instead
+RATE_LIMIT_MAX_WAIT = 60
+# Authorization header -> epoch seconds when its exhausted rate limit window resets
+_RATE_LIMIT_RESETS: dict[str, float] = {}
+
+# Caps concurrent async GitHub calls to stay under the secondary rate limits
+GH_SEM = asyncio.Semaphore(8)
+# GitHub allows at most 80 content-creating requests per minute
+CONTENT_CREATION_LIMIT = 80
+CONTENT_CREATION_WINDOW = 60
+# Monotonic timestamps of content-creating requests within the current window
+_content_creation_times: deque[float] = deque()
+_content_creation_lock = asyncio.Lock()
+
+# Files larger than this are streamed to the blob API instead of encoded in memory
+BLOB_STREAM_THRESHOLD = 4 * 1024 * 1024
+# Multiple of 3 so base64-encoded chunks concatenate without padding
+BLOB_STREAM_CHUNK_SIZE = 3 * 16 * 1024
+# Files at least this large are read straight into a buffer sized from fstat
+PREALLOCATED_READ_THRESHOLD = 1024 * 1024
+
 # Shared utility functions
+@lru_cache(maxsize=16)
+def _github_header_items(token: str) -> tuple[tuple[str, str], ...]:
+    return (
+        ("Authorization", f"Bearer {token}"),
+        ("Accept", "application/vnd.github.v3+json")
+    )
+
 def create_github_headers(token: str) -> dict:
     """Create standard headers for GitHub API requests"""
-    return {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    return dict(_github_header_items(token))
+
+def parsed(response) -> Any:
+    """Return the decoded JSON body of a response, parsing it at most once"""
+    try:
+        return response._parsed_json
+    except AttributeError:
+        response._parsed_json = response.json()
+        return response._parsed_json
+
+def _reset_wait(reset_at: float) -> float | None:
+    """Seconds until a rate limit resets, or None if that is longer than RATE_LIMIT_MAX_WAIT"""
+    wait = max(reset_at - time.time(), 0)
+    return wait if wait <= RATE_LIMIT_MAX_WAIT else None
+
+def _rate_limit_wait(headers: dict | None) -> float:
+    """Seconds to wait before calling GitHub with these headers. Only an exhausted
+    limit that resets within RATE_LIMIT_MAX_WAIT is waited out, otherwise the call
+    goes ahead and GitHub's 403 is returned to the caller"""
+    reset_at = _RATE_LIMIT_RESETS.get((headers or {}).get("Authorization", ""))
+    if not reset_at:
+        return 0
+    return _reset_wait(reset_at) or 0
+
+def _retry_delay(response, headers: dict | None, attempt: int, max_retries: int) -> float | None:
+    """Record rate limit state from a response and return how long to wait before
+    retrying it, or None if the response should be returned as is"""
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    auth = (headers or {}).get("Authorization", "")
+    if remaining == "0" and reset:
+        _RATE_LIMIT_RESETS[auth] = float(reset)
+    else:
+        _RATE_LIMIT_RESETS.pop(auth, None)
+    
+    if attempt >= max_retries:
+        return None
+    if response.status_code in (403, 429):
+        # Secondary rate limits send Retry-After, exhausted primary limits send Remaining: 0.
+        # Any other 403 is a genuine permission error. Limits that outlast
+        # RATE_LIMIT_MAX_WAIT are returned straight away rather than waited on
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            delay = float(retry_after)
+            return delay if delay <= RATE_LIMIT_MAX_WAIT else None
+        if remaining == "0" and reset:
+            return _reset_wait(float(reset))
+        return None
+    if response.status_code >= 500:
+        return GITHUB_RETRY_BACKOFF * 2 ** attempt
+    return None
+
+def gh_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Make a GitHub API call on CLIENT, waiting out rate limits and retrying server errors"""
+    headers = kwargs.get("headers")
+    attempt = 0
+    while True:
+        # Retries already slept in _retry_delay, only the first attempt waits here
+        wait = _rate_limit_wait(headers) if attempt == 0 else 0
+        if wait:
+            logger.warning("GitHub rate limit exhausted, waiting %.1fs for reset", wait)
+            time.sleep(wait)
+        response = CLIENT.request(method, url, **kwargs)
+        delay = _retry_delay(response, headers, attempt, GITHUB_MAX_RETRIES)
+        if delay is None:
+            return response
+        logger.warning("GitHub %s %s returned %s, retrying in %.1fs", method, url, response.status_code, delay)
+        time.sleep(delay)
+        attempt += 1
+
+async def _acquire_content_creation_slot() -> None:
+    """Wait for room in the sliding window of content-creating requests"""
+    async with _content_creation_lock:
+        while True:
+            now = time.monotonic()
+            while _content_creation_times and _content_creation_times[0] <= now - CONTENT_CREATION_WINDOW:
+                _content_creation_times.popleft()
+            if len(_content_creation_times) < CONTENT_CREATION_LIMIT:
+                _content_creation_times.append(now)
+                return
+            await asyncio.sleep(_content_creation_times[0] + CONTENT_CREATION_WINDOW - now)
+
+async def gh_request_async(
+    method: str, url: str, max_retries: int = GITHUB_MAX_RETRIES, **kwargs
+) -> httpx.Response:
+    """Async gh_request on ASYNC_CLIENT, bounded by GH_SEM and the content creation
+    window. Pass max_retries=0 for streamed bodies, which cannot be replayed"""
+    headers = kwargs.get("headers")
+    # Writes count against the content creation limit, GraphQL queries do not
+    # but mutations such as createCommitOnBranch do
+    if url == "https://api.github.com/graphql":
+        query = (kwargs.get("json") or {}).get("query", "")
+        creates_content = query.lstrip().startswith("mutation")
+    else:
+        creates_content = method != "GET"
+    attempt = 0
+    while True:
+        # Retries already slept in _retry_delay, only the first attempt waits here
+        wait = _rate_limit_wait(headers) if attempt == 0 else 0
+        if wait:
+            logger.warning("GitHub rate limit exhausted, waiting %.1fs for reset", wait)
+            await asyncio.sleep(wait)
+        if creates_content:
+            await _acquire_content_creation_slot()
+        async with GH_SEM:
+            response = await ASYNC_CLIENT.request(method, url, **kwargs)
+        delay = _retry_delay(response, headers, attempt, max_retries)
+        if delay is None:
+            return response
+        logger.warning("GitHub %s %s returned %s, retrying in %.1fs", method, url, response.status_code, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+def _etag_lookup(url: str, headers: dict, params: dict | None) -> tuple[tuple[str, str], tuple | None, dict]:
+    """Find the cache entry for a GET, returning (key, entry, headers to send)"""
+    key = (str(httpx.URL(url, params=params)), headers.get("Authorization", ""))
+    with _ETAG_CACHE_LOCK:
+        cached = ETAG_CACHE.get(key)
+    request_headers = {**headers, "If-None-Match": cached[0]} if cached else headers
+    return key, cached, request_headers
+
+def _etag_result(key: tuple[str, str], cached: tuple | None, response: httpx.Response) -> tuple[int, Any, str | None]:
+    """Resolve a conditional GET against the cache, storing fresh 200 responses"""
+    if response.status_code == 304 and cached:
+        with _ETAG_CACHE_LOCK:
+            if key in ETAG_CACHE:
+                ETAG_CACHE.move_to_end(key)
+        return 200, cached[1], cached[2]
+    
+    data = parsed(response)
+    next_url = response.links.get("next", {}).get("url")
+    etag = response.headers.get("ETag")
+    if response.status_code == 200 and etag:
+        with _ETAG_CACHE_LOCK:
+            ETAG_CACHE[key] = (etag, data, next_url)
+            ETAG_CACHE.move_to_end(key)
+            while len(ETAG_CACHE) > ETAG_CACHE_MAX_SIZE:
+                ETAG_CACHE.popitem(last=False)
+    return response.status_code, data, next_url
+
+def _conditional_get(url: str, headers: dict, params: dict | None = None) -> tuple[int, Any, str | None]:
+    key, cached, request_headers = _etag_lookup(url, headers, params)
+    response = gh_request("GET", url, headers=request_headers, params=params)
+    return _etag_result(key, cached, response)
+
+def paginate(url: str, headers: dict, params: dict | None = None) -> Iterator[list]:
+    """Yield each page of a GitHub list endpoint, 100 items at a time, following Link rel="next".
+    Pages are revalidated with ETags like cached_get."""
+    params = {"per_page": 100, **(params or {})}
+    while url:
+        status_code, data, next_url = _conditional_get(url, headers, params)
+        if status_code != 200:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to fetch {url}: {data.get('message', 'Unknown error')}"
+            )
+        yield data
+        # The next link already carries the query parameters
+        url = next_url
+        params = None
+
+def cached_get(url: str, headers: dict) -> tuple[int, Any]:
+    """GET a GitHub URL, revalidating cached responses with If-None-Match.
+    
+    A 304 is answered from the cache and does not count against the rate limit.
+    Entries are keyed by token as well as URL so private data is never shared.
+    
+    Returns:
+        tuple: (status_code, data) where a 304 is reported as 200 with the cached data
+    """
+    status_code, data, _ = _conditional_get(url, headers)
+    return status_code, data
 
-def validate_repo_access(token: str, repo_name: str) -> None:
-    """Validate repository exists and is accessible"""
+def validate_repo_access(token: str, repo_name: str) -> dict:
+    """Validate repository exists and is accessible, returning its details"""
     headers = create_github_headers(token)
     repo_url = f"https://api.github.com/repos/{repo_name}"
-    response = requests.get(repo_url, headers=headers)
+    status_code, repo_data = cached_get(repo_url, headers)
     
-    if response.status_code == 404:
+    if status_code == 404:
         raise HTTPException(status_code=404, detail=f"Repository {repo_name} not found")
-    elif response.status_code != 200:
+    elif status_code != 200:
         raise HTTPException(
             status_code=400,
-            detail=f"Failed to access repository: {response.json().get('message', 'Unknown error')}"
+            detail=f"Failed to access repository: {repo_data.get('message', 'Unknown error')}"
         )
+    return repo_data
 
 def validate_branch_exists(token: str, repo_name: str, branch_name: str) -> str:
     """Validate branch exists and return its SHA"""
     headers = create_github_headers(token)
     
-    # First check if the branch exists in the list of branches
-    branches_url = f"https://api.github.com/repos/{repo_name}/branches"
-    print(f"Checking branches at: {branches_url}")
-    branches_response = requests.get(branches_url, headers=headers)
-    print(f"Branches check response status: {branches_response.status_code}")
+    # The singular git/ref endpoint only matches the exact branch, unlike git/refs
+    # which falls back to prefix matching, so one call both validates and resolves
+    ref_url = f"https://api.github.com/repos/{repo_name}/git/ref/heads/{branch_name}"
+    logger.debug("Getting branch reference at: %s", ref_url)
+    ref_status, ref_data = cached_get(ref_url, headers)
+    logger.debug("Branch reference response status: %s", ref_status)
     
-    if branches_response.status_code == 200:
-        branches = branches_response.json()
-        branch_exists = any(branch["name"] == branch_name for branch in branches)
-        print(f"Branch {branch_name} exists: {branch_exists}")
-        
-        if branch_exists:
-            # Now get the specific branch reference
-            ref_url = f"https://api.github.com/repos/{repo_name}/git/refs/heads/{branch_name}"
-            print(f"Getting branch reference at: {ref_url}")
-            response = requests.get(ref_url, headers=headers)
-            print(f"Branch reference response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                sha = response.json()["object"]["sha"]
-                print(f"Got branch SHA: {sha}")
-                return sha
+    if ref_status == 200:
+        sha = ref_data["object"]["sha"]
+        logger.debug("Got branch SHA: %s", sha)
+        return sha
     
-    print("Branch not found or error occurred")
+    logger.debug("Branch not found or error occurred")
     return ""
 
 def handle_github_error(error: Exception, default_message: str = "GitHub API error") -> None:
     """Handle GitHub API errors consistently"""
-    if isinstance(error, requests.exceptions.RequestException):
+    if isinstance(error, httpx.HTTPError):
         raise HTTPException(status_code=400, detail=str(error)) from error
     raise HTTPException(status_code=400, detail=default_message) from error
 
-def process_file_for_github(file_path: str, repo_name: str, headers: dict) -> tuple[dict, str]:
+def workspace_full_path(file_path: str) -> str:
+    """Return the absolute workspace path, adding the /app/ prefix if not present"""
+    return file_path if file_path.startswith('/app/') else f'/app/{file_path}'
+
+def git_blob_sha(content: bytes | bytearray) -> str:
+    """Compute the SHA git assigns to a blob with this content"""
+    digest = hashlib.sha1(f"blob {len(content)}\0".encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+def file_blob_sha(full_path: str) -> str:
+    """Compute the git blob SHA of a file without reading it into memory at once"""
+    digest = hashlib.sha1(f"blob {os.path.getsize(full_path)}\0".encode())
+    with open(full_path, 'rb') as file:
+        while chunk := file.read(BLOB_STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_bytes(full_path: str) -> bytes | bytearray:
+    """Read a whole file with unbuffered I/O. Called via asyncio.to_thread."""
+    with open(full_path, 'rb', buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < PREALLOCATED_READ_THRESHOLD:
+            return file.readall()
+        # Fill a buffer of the known size directly, avoiding intermediate copies
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        offset = 0
+        while offset < size:
+            read = file.readinto(view[offset:])
+            if not read:
+                break
+            offset += read
+        view.release()
+        return buffer if offset == size else buffer[:offset]
+
+def read_and_encode(file_path: str) -> tuple[str, str, str]:
+    """Read a workspace file and base64-encode it for the GitHub blob API.
+    
+    Args:
+        file_path: The path to the file in the workspace
+        
+    Returns:
+        tuple: (github_path, content_b64, blob_sha)
+        - github_path: Repository-relative path for the GitHub tree
+        - content_b64: Base64-encoded file content
+        - blob_sha: The git blob SHA of the content
+    """
+    content = _read_bytes(workspace_full_path(file_path))
+    
+    # Normalize path for GitHub
+    # Always use the path as is to maintain directory structure
+    # Just remove any leading slashes to make it relative
+    github_path = file_path.lstrip('/')
+    
+    return github_path, base64.b64encode(content).decode('ascii'), git_blob_sha(content)
+
+async def get_tree_blob_shas(repo_name: str, tree_ish: str, headers: dict) -> dict[str, str]:
+    """Map each file path in a tree to its blob SHA, empty if the tree can't be read.
+    A truncated listing still gives valid, if partial, results."""
+    tree_url = f"https://api.github.com/repos/{repo_name}/git/trees/{tree_ish}"
+    response = await gh_request_async("GET", tree_url, headers=headers, params={"recursive": 1})
+    if response.status_code != 200:
+        logger.warning("Failed to get tree for %s: %s", tree_ish, response.status_code)
+        return {}
+    return {
+        item["path"]: item["sha"]
+        for item in parsed(response).get("tree", [])
+        if item["type"] == "blob"
+    }
+
+async def iter_blob_payload(full_path: str) -> AsyncIterator[bytes]:
+    """Yield the JSON body for a blob upload, base64-encoding the file chunk by chunk"""
+    yield b'{"encoding": "base64", "content": "'
+    file = await asyncio.to_thread(open, full_path, 'rb')
+    try:
+        while chunk := await asyncio.to_thread(file.read, BLOB_STREAM_CHUNK_SIZE):
+            yield base64.b64encode(chunk)
+    finally:
+        file.close()
+    yield b'"}'
+
+async def process_file_for_github(
+    file_path: str, repo_name: str, headers: dict, known_shas: set[str] | frozenset[str] = frozenset()
+) -> tuple[dict, str]:
     """Process a file for GitHub, creating a blob and normalizing the path.
     
     Args:
         file_path: The path to the file in the workspace
         repo_name: The name of the GitHub repository
         headers: The GitHub API headers
+        known_shas: Blob SHAs already in the repository, which are not uploaded again
         
     Returns:
         tuple: (tree_entry, error_message)
@@ -78,35 +415,43 @@ def process_file_for_github(file_path: str, repo_name: str, headers: dict) -> tu
         - error_message: Error message if any, empty string if successful
     """
     try:
-        # Add /app/ prefix if not present
-        full_path = file_path if file_path.startswith('/app/') else f'/app/{file_path}'
-        
-        # Read file content
-        with open(full_path, 'r') as file:
-            content = file.read()
-        
-        # Create blob
         blob_url = f"https://api.github.com/repos/{repo_name}/git/blobs"
-        blob_data = {
-            "content": content,
-            "encoding": "utf-8"
-        }
-        blob_response = requests.post(blob_url, headers=headers, json=blob_data)
+        full_path = workspace_full_path(file_path)
         
-        if blob_response.status_code != 201:
-            return None, f"Failed to create blob: {blob_response.json().get('message', 'Unknown error')}"
+        if await asyncio.to_thread(os.path.getsize, full_path) > BLOB_STREAM_THRESHOLD:
+            # Stream large files so the full encoded content is never held in memory
+            github_path = file_path.lstrip('/')
+            blob_sha = await asyncio.to_thread(file_blob_sha, full_path)
+            request_kwargs = {
+                "headers": {**headers, "Content-Type": "application/json"},
+                "content": iter_blob_payload(full_path),
+                "max_retries": 0
+            }
+        else:
+            # Read file content off the event loop
+            github_path, content_b64, blob_sha = await asyncio.to_thread(read_and_encode, file_path)
+            request_kwargs = {
+                "headers": headers,
+                "json": {
+                    "content": content_b64,
+                    "encoding": "base64"
+                }
+            }
         
-        # Normalize path for GitHub
-        # Always use the path as is to maintain directory structure
-        # Just remove any leading slashes to make it relative
-        github_path = file_path.lstrip('/')
+        # Create blob unless the repository already has this exact content
+        if blob_sha not in known_shas:
+            blob_response = await gh_request_async("POST", blob_url, **request_kwargs)
+            
+            if blob_response.status_code != 201:
+                return None, f"Failed to create blob: {parsed(blob_response).get('message', 'Unknown error')}"
+            blob_sha = parsed(blob_response)["sha"]
         
         # Create tree entry
         tree_entry = {
             "path": github_path,
             "mode": "100644",
             "type": "blob",
-            "sha": blob_response.json()["sha"]
+            "sha": blob_sha
         }
         
         return tree_entry, ""
@@ -114,6 +459,9 @@ def process_file_for_github(file_path: str, repo_name: str, headers: dict) -> tu
     except Exception as e:
         return None, f"Error processing file: {str(e)}"
 
+# Config for models built in bulk from GitHub and filesystem listings
+LISTING_MODEL_CONFIG = ConfigDict(frozen=True)
+
 # Auth Models
 class AuthRequest(BaseModel):
     token: str
@@ -124,6 +472,8 @@ class AuthResponse(BaseModel):
 
 # Repository Models
 class Repository(BaseModel):
+    model_config = LISTING_MODEL_CONFIG
+
     name: str
     description: str | None
 
@@ -157,8 +507,10 @@ class TokenResponse(BaseModel):
 
 # File Models
 class RepoFile(BaseModel):
+    model_config = LISTING_MODEL_CONFIG
+
     path: str
-    content: str
+    content: str | None = None  # Only populated when include_content is requested
     sha: str
     last_modified: str | None = None
 
@@ -166,12 +518,15 @@ class RepoFilesRequest(BaseModel):
     token: str
     repo_name: str
     branch: str = "main"
+    include_content: bool = False
 
 class RepoFilesResponse(BaseModel):
     files: List[RepoFile]
 
 # Branch Models
 class Branch(BaseModel):
+    model_config = LISTING_MODEL_CONFIG
+
     name: str
     protected: bool
     default: bool
@@ -216,6 +571,8 @@ class BranchProtectionResponse(BaseModel):
 
 # Workspace Models
 class FileInfo(BaseModel):
+    model_config = LISTING_MODEL_CONFIG
+
     path: str
     type: str  # 'file' or 'directory'
     name: str
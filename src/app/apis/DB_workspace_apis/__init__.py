@@ -1,15 +1,82 @@
 from fastapi import APIRouter, HTTPException
+import anyio
+from fastapi.responses import FileResponse
 import os
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import attrgetter
+from typing import Iterator
 from app.apis.DB_shared_models import (
     FileInfo, DirectoryContent,
-    ReadFileRequest, ReadFileResponse
+    ReadFileRequest, ReadFileResponse,
+    workspace_full_path
 )
 
 router = APIRouter(prefix="/workspace/api")
 
-@router.get("/list-files", response_model=DirectoryContent)
-def workspace_list_files():
+# path -> ((mtime_ns, size), content, last_modified), evicted least recently used first.
+# Size catches rewrites within one mtime tick on filesystems with coarse timestamps
+_file_cache: OrderedDict[str, tuple[tuple[int, int], str, str]] = OrderedDict()
+FILE_CACHE_MAX_SIZE = 128
+# Total characters of file content held in the cache
+FILE_CACHE_MAX_CHARS = 32 * 1024 * 1024
+# Larger files are not cached so a single one cannot flush the rest
+FILE_CACHE_MAX_ENTRY_CHARS = 4 * 1024 * 1024
+_file_cache_chars = 0
+_file_cache_lock = threading.Lock()
+
+@lru_cache(maxsize=4096)
+def _iso_mtime(sec: int) -> str:
+    """Format a whole-second mtime as a local ISO 8601 timestamp.
+    
+    Files saved in the same second share one formatted string."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(sec))
+
+def _resolve_workspace_path(path: str) -> str:
+    """Canonicalize a workspace path, rejecting anything that escapes /app/"""
+    real = os.path.realpath(workspace_full_path(path))
+    if not real.startswith('/app/'):
+        raise HTTPException(status_code=400, detail='invalid path')
+    return real
+
+def _iter_files(base: str) -> Iterator[tuple[str, str, float]]:
+    """Yield (path, name, mtime) for every non-hidden file under base.
+    
+    scandir entries carry the file type from readdir, so only the mtime
+    lookup costs a stat call per file. Symlinked files are listed like
+    os.walk does, symlinked directories are not entered."""
+    stack = [base]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path, entry.name, entry.stat().st_mtime
+
+def _walk_one(base_dir: str) -> list[FileInfo]:
+    """List the files under one base directory, logging and skipping it on error"""
+    files = []
+    try:
+        if os.path.exists(base_dir):
+            for file_path, file_name, mtime in _iter_files(base_dir):
+                # Values come straight from the OS, so skip validation
+                files.append(FileInfo.model_construct(
+                    path=file_path,
+                    type="file",
+                    name=file_name,
+                    last_modified=_iso_mtime(int(mtime))
+                ))
+    except Exception as e:
+        print(f"Error accessing {base_dir}: {str(e)}")
+    return files
+
+def _collect_files() -> DirectoryContent:
     try:
         # Use absolute path /app
         base_path = "/app"
@@ -21,46 +88,70 @@ def workspace_list_files():
             os.path.join(base_path, "ui/src/utils")
         ]
         
-        all_files = []
-        
-        for base_dir in base_dirs:
-            try:
-                if os.path.exists(base_dir):
-                    for root, dirs, files in os.walk(base_dir):
-                        for file_name in files:
-                            if not file_name.startswith('.'):
-                                file_path = os.path.join(root, file_name)
-                                stat = os.stat(file_path)
-                                all_files.append(FileInfo(
-                                    path=file_path,
-                                    type="file",
-                                    name=file_name,
-                                    last_modified=datetime.fromtimestamp(stat.st_mtime).isoformat()
-                                ))
-            except Exception as e:
-                print(f"Error accessing {base_dir}: {str(e)}")
-                continue
+        # The subtrees are independent, so overlap their directory reads
+        with ThreadPoolExecutor(max_workers=len(base_dirs)) as executor:
+            all_files = [info for files in executor.map(_walk_one, base_dirs) for info in files]
         
-        sorted_files = sorted(all_files, key=lambda x: x.path)
-        return DirectoryContent(files=sorted_files)
+        all_files.sort(key=attrgetter('path'))
+        return DirectoryContent.model_construct(files=all_files)
     except Exception as e:
         print(f"Error listing workspace files: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/read-file", response_model=ReadFileResponse)
-def workspace_read_file(body: ReadFileRequest):
+def _cache_file(file_path: str, entry: tuple[tuple[int, int], str, str]) -> None:
+    """Store a file read, evicting the oldest until both caps are met"""
+    global _file_cache_chars
+    with _file_cache_lock:
+        previous = _file_cache.pop(file_path, None)
+        if previous is not None:
+            _file_cache_chars -= len(previous[1])
+        _file_cache[file_path] = entry
+        _file_cache_chars += len(entry[1])
+        while len(_file_cache) > FILE_CACHE_MAX_SIZE or _file_cache_chars > FILE_CACHE_MAX_CHARS:
+            _, evicted = _file_cache.popitem(last=False)
+            _file_cache_chars -= len(evicted[1])
+
+def _read_file(path: str) -> ReadFileResponse:
+    # Resolve symlinks and '..' before touching the file system
+    file_path = _resolve_workspace_path(path)
     try:
-        # Ensure we have the absolute path with /app/ prefix
-        file_path = body.path
-        if not file_path.startswith('/app/'):
-            file_path = f'/app/{file_path}'
+        # Serve the cached content while the file's mtime and size are unchanged
+        stat = os.stat(file_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with _file_cache_lock:
+            entry = _file_cache.get(file_path)
+            if entry and entry[0] == version:
+                _file_cache.move_to_end(file_path)
+                return ReadFileResponse(content=entry[1], last_modified=entry[2])
         
         # Read the file content
         with open(file_path, 'r') as f:
             content = f.read()
         
-        stat = os.stat(file_path)
-        last_modified = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        last_modified = _iso_mtime(int(stat.st_mtime))
+        if len(content) <= FILE_CACHE_MAX_ENTRY_CHARS:
+            _cache_file(file_path, (version, content, last_modified))
         return ReadFileResponse(content=content, last_modified=last_modified)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/list-files", response_model=DirectoryContent)
+async def workspace_list_files():
+    # Walk the tree in a worker thread so the event loop stays free
+    return await anyio.to_thread.run_sync(_collect_files)
+
+@router.post("/read-file", response_model=ReadFileResponse)
+async def workspace_read_file(body: ReadFileRequest):
+    return await anyio.to_thread.run_sync(_read_file, body.path)
+
+@router.get("/read-file-raw")
+def workspace_read_file_raw(path: str):
+    """Send the file's bytes as text/plain without loading them into memory"""
+    file_path = _resolve_workspace_path(path)
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # FileResponse derives Last-Modified and ETag from the stat result
+    return FileResponse(file_path, media_type='text/plain', stat_result=stat)
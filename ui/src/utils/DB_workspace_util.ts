@@ -455,7 +455,8 @@ export const useGitHubStore = create<GitHubStore>((set, get) => ({
       body: JSON.stringify({
         token,
         repo_name: selectedRepo,
-        branch: currentBranch
+        branch: currentBranch,
+        include_content: true
       }),
       credentials: 'include'
     })